@@ -3,6 +3,7 @@
 
 import logging
 import importlib
+from functools import partial
 from nonebot.typing import Bot, Dict, Type, Union, Driver, Optional, NoReturn
 
 _driver: Optional[Driver] = None
@@ -88,7 +89,7 @@ def get_bots() -> Dict[str, Bot]:
     """
     :说明:
 
-      获取所有通过 ws 连接 NoneBot 的 Bot 对象。
+      获取所有通过 ws 连接 NoneBot 的 Bot 对象，以及近期通过 http 上报事件的 Bot 对象。
 
     :返回:
 
@@ -112,6 +113,8 @@ def get_bots() -> Dict[str, Bot]:
 from nonebot.log import logger
 from nonebot.config import Env, Config
 from nonebot.adapters.cqhttp import Bot as CQBot
+from nonebot.matcher import start_sweeper, stop_sweeper
+from nonebot.utils import set_json_backend, create_executors, shutdown_executors
 
 try:
     import nonebot_test
@@ -153,6 +156,8 @@ def init(*, _env_file: Optional[str] = None, **kwargs):
     logger.setLevel(logging.DEBUG if config.debug else logging.INFO)
     logger.debug(f"Loaded config: {config.dict()}")
 
+    set_json_backend(config.json_backend)
+
     DriverClass: Type[Driver] = getattr(importlib.import_module(config.driver),
                                         "Driver")
     _driver = DriverClass(env, config)
@@ -160,6 +165,14 @@ def init(*, _env_file: Optional[str] = None, **kwargs):
     # register build-in adapters
     _driver.register_adapter("cqhttp", CQBot)
 
+    # clean up expired sessions and temp matchers in background
+    _driver.on_startup(start_sweeper)
+    _driver.on_shutdown(stop_sweeper)
+
+    # executors for run_sync
+    _driver.on_startup(partial(create_executors, config.executors))
+    _driver.on_shutdown(shutdown_executors)
+
     # load nonebot test frontend if debug
     if config.debug and nonebot_test:
         logger.debug("Loading nonebot test frontend...")
@@ -2,8 +2,8 @@
 # -*- coding: utf-8 -*-
 
 import abc
-from functools import reduce, partial
-from dataclasses import dataclass, field
+from functools import partial
+from dataclasses import dataclass
 
 from nonebot.config import Config
 from nonebot.typing import Driver, Message, WebSocket
@@ -29,15 +29,30 @@ class BaseBot(abc.ABC):
     def __getattr__(self, name: str) -> Callable[..., Awaitable[Any]]:
         return partial(self.call_api, name)
 
+    @classmethod
+    async def startup(cls, driver: Driver) -> None:
+        """驱动器启动时调用，适配器可在此创建连接池等共享资源"""
+        pass
+
+    @classmethod
+    async def shutdown(cls, driver: Driver) -> None:
+        """驱动器关闭时调用，适配器可在此释放 ``startup`` 中创建的资源"""
+        pass
+
     @property
     @abc.abstractmethod
     def type(self) -> str:
         raise NotImplementedError
 
     @abc.abstractmethod
-    async def handle_message(self, message: dict):
+    async def handle_message(self, message: dict) -> Optional[dict]:
+        """处理上报数据，HTTP 方式上报时返回值不为空则作为响应内容返回"""
         raise NotImplementedError
 
+    async def handle_disconnect(self):
+        """WebSocket 连接断开时由驱动器调用，适配器应在此结束等待中的 API 调用"""
+        pass
+
     @abc.abstractmethod
     async def call_api(self, api: str, data: dict):
         raise NotImplementedError
@@ -178,8 +193,14 @@ class BaseEvent(abc.ABC):
 
 @dataclass
 class BaseMessageSegment(abc.ABC):
+    """
+    消息段。
+
+    使用 ``__slots__`` 存储，子类也需声明 ``__slots__ = ()`` 以避免创建实例字典。
+    """
+    __slots__ = ("type", "data")
     type: str
-    data: Dict[str, Union[str, list]] = field(default_factory=lambda: {})
+    data: Dict[str, Union[str, list]]
 
     @abc.abstractmethod
     def __str__(self):
@@ -191,6 +212,14 @@ class BaseMessageSegment(abc.ABC):
 
 
 class BaseMessage(list, abc.ABC):
+    """
+    消息段列表。
+
+    ``__str__`` 与 ``extract_plain_text`` 的结果会被缓存，通过列表方法修改消息时缓存失效；
+    直接修改消息段的 ``data`` 不会使缓存失效，需要修改消息段时请替换整个消息段。
+    """
+    _str: Optional[str] = None
+    _plain_text: Optional[str] = None
 
     def __init__(self,
                  message: Union[str, dict, list, BaseMessageSegment,
@@ -198,15 +227,22 @@ class BaseMessage(list, abc.ABC):
                  *args,
                  **kwargs):
         super().__init__(*args, **kwargs)
-        if isinstance(message, (str, dict, list)):
+        if isinstance(message, BaseMessage):
+            # 复制消息段，之后合并文本时不会修改原消息
+            self.extend(type(seg)(seg.type, seg.data.copy()) for seg in message)
+        elif isinstance(message, (str, dict, list)):
             self.extend(self._construct(message))
-        elif isinstance(message, BaseMessage):
-            self.extend(message)
         elif isinstance(message, BaseMessageSegment):
             self.append(message)
 
     def __str__(self):
-        return ''.join((str(seg) for seg in self))
+        if self._str is None:
+            self._str = ''.join((str(seg) for seg in self))
+        return self._str
+
+    def _invalidate(self) -> None:
+        self._str = None
+        self._plain_text = None
 
     @staticmethod
     @abc.abstractmethod
@@ -229,10 +265,47 @@ class BaseMessage(list, abc.ABC):
         result = self.__class__(other)
         return result.__add__(self)
 
+    def __setitem__(self, key, value):
+        self._invalidate()
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self._invalidate()
+        super().__delitem__(key)
+
+    def __iadd__(self, other):
+        self._invalidate()
+        return super().__iadd__(other)
+
+    def insert(self, index, obj):
+        self._invalidate()
+        super().insert(index, obj)
+
+    def pop(self, *args):
+        self._invalidate()
+        return super().pop(*args)
+
+    def remove(self, obj):
+        self._invalidate()
+        super().remove(obj)
+
+    def clear(self):
+        self._invalidate()
+        super().clear()
+
+    def sort(self, *args, **kwargs):
+        self._invalidate()
+        super().sort(*args, **kwargs)
+
+    def reverse(self):
+        self._invalidate()
+        super().reverse()
+
     def append(self, obj: Union[str, BaseMessageSegment]) -> "BaseMessage":
+        self._invalidate()
         if isinstance(obj, BaseMessageSegment):
             if obj.type == "text" and self and self[-1].type == "text":
-                self[-1].data["text"] += obj.data["text"]
+                self[-1] = self._merge_text(self[-1], obj)
             else:
                 super().append(obj)
         elif isinstance(obj, str):
@@ -248,19 +321,27 @@ class BaseMessage(list, abc.ABC):
             self.append(segment)
         return self
 
+    @staticmethod
+    def _merge_text(first: BaseMessageSegment,
+                    second: BaseMessageSegment) -> BaseMessageSegment:
+        # 构造新的消息段而不修改原消息段，原消息段可能同时属于其他消息
+        return type(first)(first.type, {
+            **first.data, "text": first.data["text"] + second.data["text"]
+        })
+
     def reduce(self) -> None:
+        self._invalidate()
         index = 0
         while index < len(self):
             if index > 0 and self[
                     index - 1].type == "text" and self[index].type == "text":
-                self[index - 1].data["text"] += self[index].data["text"]
+                self[index - 1] = self._merge_text(self[index - 1], self[index])
                 del self[index]
             else:
                 index += 1
 
     def extract_plain_text(self) -> str:
-
-        def _concat(x: str, y: BaseMessageSegment) -> str:
-            return f"{x} {y.data['text']}" if y.type == "text" else x
-
-        return reduce(_concat, self, "")
+        if self._plain_text is None:
+            self._plain_text = "".join(
+                f" {seg.data['text']}" for seg in self if seg.type == "text")
+        return self._plain_text
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CQ 码编解码
+===========
+
+CQ 码字符串与消息段之间的转换，供 CQHTTP 适配器使用。
+"""
+
+import re
+import sys
+
+from nonebot.typing import Any, Dict, List, Tuple, Iterable, Iterator
+
+_CQCODE = re.compile(r"\[CQ:(?P<type>[a-zA-Z0-9-_.]+)"
+                     r"(?P<params>"
+                     r"(?:,[a-zA-Z0-9-_.]+=?[^,\]]*)*"
+                     r"),?\]")
+
+
+def escape(s: str, *, escape_comma: bool = True) -> str:
+    """
+    对字符串进行 CQ 码转义。
+
+    ``escape_comma`` 参数控制是否转义逗号（``,``）。
+    """
+    # str.replace 在没有匹配时直接返回原字符串，比单次正则替换或 str.translate 更快
+    s = s.replace("&", "&amp;").replace("[", "&#91;").replace("]", "&#93;")
+    if escape_comma:
+        s = s.replace(",", "&#44;")
+    return s
+
+
+def unescape(s: str) -> str:
+    """对字符串进行 CQ 码去转义。"""
+    if "&" not in s:
+        return s
+    return s.replace("&#44;", ",") \
+        .replace("&#91;", "[") \
+        .replace("&#93;", "]") \
+        .replace("&amp;", "&")
+
+
+def _parse_params(params: str) -> Dict[str, str]:
+    data = {}
+    for param in params.split(","):
+        param = param.lstrip()
+        if param:
+            key, _, value = param.partition("=")
+            data[key] = unescape(value)
+    return data
+
+
+def tokenize(msg: str) -> Iterator[Tuple[str, Dict[str, str]]]:
+    """
+    :说明:
+
+      将 CQ 码字符串逐个解析为消息段的 ``(type, data)``，文本已去转义，空文本段会被跳过。
+
+    :参数:
+
+      * ``msg: str``: CQ 码字符串
+    """
+    if "[" not in msg:
+        if msg:
+            yield "text", {"text": unescape(msg)}
+        return
+
+    text_begin = 0
+    for cqcode in _CQCODE.finditer(msg):
+        start, end = cqcode.span()
+        if start > text_begin:
+            yield "text", {"text": unescape(msg[text_begin:start])}
+        text_begin = end
+        yield sys.intern(cqcode.group("type")), _parse_params(
+            cqcode.group("params"))
+    if text_begin < len(msg):
+        yield "text", {"text": unescape(msg[text_begin:])}
+
+
+def _write_segment(parts: List[str], type_: str, data: Dict[str, Any]):
+    if type_ == "text":
+        parts.append(escape(data.get("text", ""), escape_comma=False))
+        return
+
+    parts += ("[CQ:", type_)
+    for key, value in data.items():
+        if value is not None:
+            parts += (",", key, "=", escape(str(value)))
+    parts.append("]")
+
+
+def dump_segment(type_: str, data: Dict[str, Any]) -> str:
+    """
+    :说明:
+
+      将单个消息段序列化为 CQ 码字符串。
+    """
+    if type_ == "text":
+        return escape(data.get("text", ""), escape_comma=False)
+
+    parts: List[str] = []
+    _write_segment(parts, type_, data)
+    return "".join(parts)
+
+
+def dumps(segments: Iterable[Any]) -> str:
+    """
+    :说明:
+
+      将消息段序列写入同一个缓冲区并序列化为 CQ 码字符串。
+
+    :参数:
+
+      * ``segments: Iterable[MessageSegment]``: 具有 ``type`` 与 ``data`` 属性的消息段序列
+    """
+    parts: List[str] = []
+    for seg in segments:
+        _write_segment(parts, seg.type, seg.data)
+    return "".join(parts)
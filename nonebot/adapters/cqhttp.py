@@ -14,45 +14,35 @@ CQHTTP (OneBot) v11 协议适配
 
 import re
 import sys
+import time
 import asyncio
+import inspect
+from bisect import bisect_left
+from collections import OrderedDict
 
 import httpx
 
 from nonebot.log import logger
 from nonebot.config import Config
 from nonebot.message import handle_event
-from nonebot.typing import Any, Dict, Union, Tuple, Iterable, Optional
+from nonebot.utils import json_loads, json_dumpb
+from nonebot.typing import Any, Set, Dict, List, Tuple, Union, Iterable, Optional
+from nonebot.typing import Callable, Awaitable
 from nonebot.exception import NetworkError, ActionFailed, ApiNotAvailable
 from nonebot.typing import overrides, Driver, WebSocket, NoReturn
 from nonebot.adapters import BaseBot, BaseEvent, BaseMessage, BaseMessageSegment
-
-
-def escape(s: str, *, escape_comma: bool = True) -> str:
-    """
-    对字符串进行 CQ 码转义。
-
-    ``escape_comma`` 参数控制是否转义逗号（``,``）。
-    """
-    s = s.replace("&", "&amp;") \
-        .replace("[", "&#91;") \
-        .replace("]", "&#93;")
-    if escape_comma:
-        s = s.replace(",", "&#44;")
-    return s
-
-
-def unescape(s: str) -> str:
-    """对字符串进行 CQ 码去转义。"""
-    return s.replace("&#44;", ",") \
-        .replace("&#91;", "[") \
-        .replace("&#93;", "]") \
-        .replace("&amp;", "&")
+from nonebot.adapters.cqcode import escape, unescape, tokenize, dump_segment, dumps
 
 
 def _b2s(b: Optional[bool]) -> Optional[str]:
     return b if b is None else str(b).lower()
 
 
+# httpx 0.16 起原始请求体通过 content 传递，data 传入 bytes 会产生 DeprecationWarning
+_BODY_PARAM = "content" if "content" in inspect.signature(
+    httpx.AsyncClient.post).parameters else "data"
+
+
 def _check_at_me(bot: "Bot", event: "Event"):
     if event.type != "message":
         return
@@ -111,7 +101,18 @@ def _check_nickname(bot: "Bot", event: "Event"):
             nickname = m.group(1)
             logger.debug(f"User is calling me {nickname}")
             event.to_me = True
-            first_msg_seg.data["text"] = first_text[m.end():]
+            event.message[0] = MessageSegment.text(first_text[m.end():])
+
+
+def _invalidate_api_cache(bot: "Bot", event: "Event"):
+    if event.detail_type not in ("group_increase", "group_decrease",
+                                 "group_admin"):
+        return
+
+    # 群成员变化，清除该群的群信息及成员信息
+    bot.api_cache.invalidate(group_id=event.group_id)
+    if str(event.user_id) == bot.self_id:
+        bot.api_cache.invalidate("get_group_list")
 
 
 def _handle_api_result(result: Optional[Dict[str, Any]]) -> Any:
@@ -121,37 +122,184 @@ def _handle_api_result(result: Optional[Dict[str, Any]]) -> Any:
         return result.get("data")
 
 
-class ResultStore:
-    _seq = 1
-    _futures: Dict[int, asyncio.Future] = {}
+def _encode_message(
+        message: Union["Message", "MessageSegment"]) -> List[Dict[str, Any]]:
+    """将消息直接转换为 OneBot 消息段数组，不进行深拷贝"""
+    if isinstance(message, MessageSegment):
+        message = (message,)
+    return [{
+        "type": seg.type,
+        "data": _encode_params(seg.data, copy=True)
+    } for seg in message]
 
-    @classmethod
-    def get_seq(cls) -> int:
-        s = cls._seq
-        cls._seq = (cls._seq + 1) % sys.maxsize
-        return s
 
-    @classmethod
-    def add_result(cls, result: Dict[str, Any]):
+def _encode_params(params: Dict[str, Any],
+                   copy: bool = False) -> Dict[str, Any]:
+    encoded = params
+    for key, value in params.items():
+        if isinstance(value, (Message, MessageSegment)):
+            if copy and encoded is params:
+                encoded = params.copy()
+            encoded[key] = _encode_message(value)
+    return encoded
+
+
+class ApiCallTracker:
+    """
+    单个连接的 API 调用记录。
+
+    记录 WebSocket 连接上等待结果的调用，连接断开时立即以 ``NetworkError`` 结束所有等待中的调用；
+    同时统计正在进行的调用数 ``in_flight`` 以及每个 API 的耗时分布 ``latency`` ，
+    ``latency[api][i]`` 为耗时不超过 ``LATENCY_BUCKETS[i]`` 秒 (且超过前一档) 的调用次数。
+    """
+    LATENCY_BUCKETS = (.01, .05, .1, .25, .5, 1., 2.5, 5., 10., float("inf"))
+
+    def __init__(self):
+        self._seq = 1
+        self._futures: Dict[int, asyncio.Future] = {}
+        self.closed = False
+        self.in_flight = 0
+        self.latency: Dict[str, List[int]] = {}
+
+    @property
+    def pending(self) -> int:
+        """等待 WebSocket 返回结果的调用数"""
+        return len(self._futures)
+
+    def register(self) -> int:
+        if self.closed:
+            raise NetworkError("WebSocket connection closed")
+        seq = self._seq
+        self._seq = (self._seq + 1) % sys.maxsize
+        self._futures[seq] = asyncio.get_event_loop().create_future()
+        return seq
+
+    def discard(self, seq: int):
+        self._futures.pop(seq, None)
+
+    def add_result(self, result: Dict[str, Any]):
         if isinstance(result.get("echo"), dict) and \
                 isinstance(result["echo"].get("seq"), int):
-            future = cls._futures.get(result["echo"]["seq"])
-            if future:
+            future = self._futures.get(result["echo"]["seq"])
+            if future and not future.done():
                 future.set_result(result)
 
-    @classmethod
-    async def fetch(cls, seq: int, timeout: Optional[float]) -> Dict[str, Any]:
-        future = asyncio.get_event_loop().create_future()
-        cls._futures[seq] = future
+    async def fetch(self, seq: int, timeout: Optional[float]) -> Dict[str, Any]:
+        future = self._futures.get(seq)
+        if future is None:
+            raise NetworkError("WebSocket connection closed")
         try:
             return await asyncio.wait_for(future, timeout)
         except asyncio.TimeoutError:
             raise NetworkError("WebSocket API call timeout")
-        finally:
-            del cls._futures[seq]
+
+    def close(self):
+        """连接断开，结束所有等待中的调用"""
+        self.closed = True
+        for future in self._futures.values():
+            if not future.done():
+                future.set_exception(
+                    NetworkError("WebSocket connection closed"))
+        self._futures.clear()
+
+    def record(self, api: str, seconds: float):
+        counts = self.latency.get(api)
+        if counts is None:
+            counts = self.latency[api] = [0] * len(self.LATENCY_BUCKETS)
+        counts[bisect_left(self.LATENCY_BUCKETS, seconds)] += 1
+
+
+class ApiCache:
+    """
+    只读 API 的结果缓存。
+
+    仅缓存 ``ttl`` 中列出的 API，按 API 名与参数保存结果 ``ttl[api]`` 秒，超过 ``maxsize`` 条时淘汰最久未使用的结果；
+    相同的调用正在进行时不再重复请求，而是等待同一结果。参数 ``no_cache`` 为真时跳过缓存读取。
+    缓存的结果会直接返回给调用者，请勿修改。
+    """
+
+    def __init__(self, ttl: Dict[str, float], maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._generation = 0
+        self._cache: "OrderedDict[Tuple[str, tuple], Tuple[float, Any]]" = \
+            OrderedDict()
+        self._inflight: Dict[Tuple[str, tuple], asyncio.Future] = {}
+
+    async def get(self, api: str, data: Dict[str, Any],
+                  call: Callable[[str, Dict[str, Any]], Awaitable[Any]]) -> Any:
+        params = tuple(
+            sorted(item for item in data.items() if item[0] != "no_cache"))
+        key = (api, params)
+        try:
+            hash(key)
+        except TypeError:
+            return await call(api, data)
+
+        if not data.get("no_cache"):
+            cached = self._cache.get(key)
+            if cached is not None:
+                if cached[0] > time.monotonic():
+                    self._cache.move_to_end(key)
+                    self.hits += 1
+                    return cached[1]
+                del self._cache[key]
+
+            future = self._inflight.get(key)
+            if future is not None:
+                self.hits += 1
+                return await asyncio.shield(future)
+
+        self.misses += 1
+        generation = self._generation
+        # 请求在独立的任务中进行，任一等待者被取消都不会影响其他等待者
+        task = asyncio.ensure_future(call(api, data))
+        self._inflight[key] = task
+
+        def _done(task: asyncio.Future):
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+            # 同时取回异常，没有等待者时避免警告
+            if task.cancelled() or task.exception() is not None:
+                return
+            # 请求期间缓存被清除时不保存可能过期的结果
+            if generation == self._generation:
+                self._cache[key] = (time.monotonic() + self.ttl[api],
+                                    task.result())
+                while len(self._cache) > self.maxsize:
+                    self._cache.popitem(last=False)
+
+        task.add_done_callback(_done)
+        return await asyncio.shield(task)
+
+    def invalidate(self, api: Optional[str] = None, **params: Any):
+        """
+        清除缓存。
+
+        ``api`` 与 ``params`` 都为空时清除全部缓存，否则清除 API 名及参数都匹配的结果 (参数按字符串比较)。
+        """
+        self._generation += 1
+        # 清除缓存前已发出的请求也不再被之后的调用共享
+        if api is None and not params:
+            self._cache.clear()
+            self._inflight.clear()
+            return
+
+        for entries in (self._cache, self._inflight):
+            for key in list(entries):
+                if api is not None and key[0] != api:
+                    continue
+                key_params = dict(key[1])
+                if all(k in key_params and str(key_params[k]) == str(v)
+                       for k, v in params.items()):
+                    del entries[key]
 
 
 class Bot(BaseBot):
+    _http_clients: Dict[str, httpx.AsyncClient] = {}
+    _handling: Set[asyncio.Future] = set()
 
     def __init__(self,
                  driver: Driver,
@@ -168,29 +316,130 @@ class Bot(BaseBot):
                          config,
                          self_id,
                          websocket=websocket)
+        self.api_calls = ApiCallTracker()
+        self.api_cache = ApiCache(config.api_cache_ttl, config.api_cache_size)
 
     @property
     @overrides(BaseBot)
     def type(self) -> str:
         return "cqhttp"
 
+    @classmethod
+    def _get_http_client(cls, config: Config,
+                         api_root: str) -> httpx.AsyncClient:
+        """获取上报地址对应的长连接客户端，不存在时创建"""
+        client = cls._http_clients.get(api_root)
+        if client is None:
+            headers = {"Content-Type": "application/json"}
+            if config.access_token is not None:
+                headers["Authorization"] = "Bearer " + config.access_token
+
+            if hasattr(httpx, "Limits"):
+                limits = {
+                    "limits":
+                        httpx.Limits(
+                            max_connections=config.api_max_connections,
+                            max_keepalive_connections=config.api_max_keepalive)
+                }
+            else:
+                # httpx < 0.14
+                limits = {
+                    "pool_limits":
+                        httpx.PoolLimits(soft_limit=config.api_max_keepalive,
+                                         hard_limit=config.api_max_connections)
+                }
+            client = httpx.AsyncClient(headers=headers,
+                                       http2=config.api_http2,
+                                       **limits)
+            cls._http_clients[api_root] = client
+        return client
+
+    @classmethod
+    @overrides(BaseBot)
+    async def startup(cls, driver: Driver) -> None:
+        for api_root in driver.config.api_root.values():
+            if not api_root.endswith("/"):
+                api_root += "/"
+            cls._get_http_client(driver.config, api_root)
+
+    @classmethod
+    @overrides(BaseBot)
+    async def shutdown(cls, driver: Driver) -> None:
+        # 等待超过快速操作时限后仍在处理的事件，再关闭 HTTP 客户端
+        if cls._handling:
+            _, pending = await asyncio.wait(
+                set(cls._handling), timeout=driver.config.event_drain_timeout)
+            if pending:
+                logger.warning(f"Shutting down with {len(pending)} events "
+                               "still being handled")
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        clients = list(cls._http_clients.values())
+        cls._http_clients.clear()
+        for client in clients:
+            await client.aclose()
+
     @overrides(BaseBot)
-    async def handle_message(self, message: dict):
+    async def handle_message(self, message: dict) -> Optional[dict]:
         if not message:
-            return
+            return None
 
         if "post_type" not in message:
-            ResultStore.add_result(message)
-            return
+            self.api_calls.add_result(message)
+            return None
+
+        event = Event(message, self)
+
+        if self.api_cache.ttl and event.type == "notice":
+            _invalidate_api_cache(self, event)
+
+        if self.connection_type == "websocket" or self.config.http_async_ack:
+            # 交由驱动器事件队列处理，避免阻塞 WebSocket 读取 API 调用结果及 HTTP 响应
+            await self.driver.event_queue.put(
+                self, event, block=self.connection_type != "websocket")
+            return None
+
+        timeout = self.config.quick_operation_timeout
+        if timeout is None or event.type != "message":
+            await handle_event(self, event)
+            return None
+
+        # 在限定时间内等待首条回复，作为快速操作随响应返回
+        quick_operation = asyncio.get_running_loop().create_future()
+        event._quick_operation = quick_operation
+        task = asyncio.ensure_future(handle_event(self, event))
+        await asyncio.wait({quick_operation, task},
+                           timeout=timeout,
+                           return_when=asyncio.FIRST_COMPLETED)
+        if not task.done():
+            # 回复之后或超时后事件继续在后台处理，保留任务引用并在结束时记录异常
+            self._handling.add(task)
+            task.add_done_callback(self._handling_done)
+        elif quick_operation.done():
+            # 已经得到回复，处理时的异常只记录不抛出
+            self._handling_done(task)
+        else:
+            task.result()
 
-        event = Event(message)
+        if quick_operation.done():
+            return quick_operation.result()
 
-        # Check whether user is calling me
-        # TODO: Check reply
-        _check_at_me(self, event)
-        _check_nickname(self, event)
+        # 超时或处理结束仍未回复，之后的回复通过 API 发送
+        quick_operation.cancel()
+        return None
 
-        await handle_event(self, event)
+    @classmethod
+    def _handling_done(cls, task: asyncio.Future):
+        cls._handling.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Error when handling event in background",
+                         exc_info=task.exception())
+
+    @overrides(BaseBot)
+    async def handle_disconnect(self):
+        self.api_calls.close()
 
     @overrides(BaseBot)
     async def call_api(self, api: str, **data) -> Union[Any, NoReturn]:
@@ -200,38 +449,53 @@ class Bot(BaseBot):
                 bot = self.driver.bots[str(self_id)]
                 return await bot.call_api(api, **data)
 
-        if self.type == "websocket":
-            seq = ResultStore.get_seq()
-            await self.websocket.send({
-                "action": api,
-                "params": data,
-                "echo": {
-                    "seq": seq
-                }
-            })
-            return _handle_api_result(await ResultStore.fetch(
-                seq, self.config.api_timeout))
+        data = _encode_params(data)
+
+        if api in self.api_cache.ttl:
+            return await self.api_cache.get(api, data, self._call_api)
+        return await self._call_api(api, data)
+
+    async def _call_api(self, api: str, data: Dict[str, Any]) -> Any:
+        self.api_calls.in_flight += 1
+        start = time.perf_counter()
+        try:
+            return await self._request(api, data)
+        finally:
+            self.api_calls.in_flight -= 1
+            self.api_calls.record(api, time.perf_counter() - start)
 
-        elif self.type == "http":
+    async def _request(self, api: str, data: Dict[str, Any]) -> Any:
+        if self.connection_type == "websocket":
+            seq = self.api_calls.register()
+            try:
+                await self.websocket.send({
+                    "action": api,
+                    "params": data,
+                    "echo": {
+                        "seq": seq
+                    }
+                })
+                result = await self.api_calls.fetch(seq,
+                                                    self.config.api_timeout)
+            finally:
+                self.api_calls.discard(seq)
+            return _handle_api_result(result)
+
+        elif self.connection_type == "http":
             api_root = self.config.api_root.get(self.self_id)
             if not api_root:
                 raise ApiNotAvailable
             elif not api_root.endswith("/"):
                 api_root += "/"
 
-            headers = {}
-            if self.config.access_token is not None:
-                headers["Authorization"] = "Bearer " + self.config.access_token
-
+            client = self._get_http_client(self.config, api_root)
             try:
-                async with httpx.AsyncClient(headers=headers) as client:
-                    response = await client.post(
-                        api_root + api,
-                        json=data,
-                        timeout=self.config.api_timeout)
+                response = await client.post(api_root + api,
+                                             timeout=self.config.api_timeout,
+                                             **{_BODY_PARAM: json_dumpb(data)})
 
                 if 200 <= response.status_code < 300:
-                    result = response.json()
+                    result = json_loads(response.content)
                     return _handle_api_result(result)
                 raise NetworkError(f"HTTP request received unexpected "
                                    f"status code: {response.status_code}")
@@ -248,6 +512,16 @@ class Bot(BaseBot):
 
         at_sender = kwargs.pop("at_sender", False) and bool(event.user_id)
 
+        quick_operation = event._quick_operation
+        if quick_operation is not None and not quick_operation.done() \
+                and not kwargs:
+            # 回复发送者时直接作为快速操作返回，无消息 ID
+            quick_operation.set_result({
+                "reply": _encode_message(msg),
+                "at_sender": at_sender
+            })
+            return None
+
         params = {}
         if event.user_id:
             params["user_id"] = event.user_id
@@ -272,12 +546,35 @@ class Bot(BaseBot):
 
 
 class Event(BaseEvent):
+    """
+    CQHTTP 事件。
 
-    def __init__(self, raw_event: dict):
-        if "message" in raw_event:
-            raw_event["message"] = Message(raw_event["message"])
+    ``message`` 在首次访问时才会被解析为 ``Message``，并同时完成 ``to_me`` 的检查；
+    不需要解析消息时可以使用 ``raw_message`` 获取原始字符串。
+    """
 
+    def __init__(self, raw_event: dict, bot: Optional["Bot"] = None):
         super().__init__(raw_event)
+        self._bot = bot
+        self._quick_operation: Optional[asyncio.Future] = None
+        self._message_parsed = False
+
+    def _parse_message(self) -> None:
+        if self._message_parsed:
+            return
+        self._message_parsed = True
+
+        raw_message = self._raw_event.get("message")
+        if raw_message is None:
+            return
+
+        if not isinstance(raw_message, Message):
+            self._raw_event["message"] = Message(raw_message)
+        if self._bot is not None:
+            # Check whether user is calling me
+            # TODO: Check reply
+            _check_at_me(self._bot, self)
+            _check_nickname(self._bot, self)
 
     @property
     @overrides(BaseEvent)
@@ -355,27 +652,38 @@ class Event(BaseEvent):
     @property
     @overrides(BaseEvent)
     def to_me(self) -> Optional[bool]:
+        self._parse_message()
         return self._raw_event.get("to_me")
 
     @to_me.setter
     @overrides(BaseEvent)
     def to_me(self, value) -> None:
+        # 先完成解析，避免之后解析消息时覆盖设置的值
+        self._parse_message()
         self._raw_event["to_me"] = value
 
     @property
     @overrides(BaseEvent)
     def message(self) -> Optional["Message"]:
+        self._parse_message()
         return self._raw_event.get("message")
 
     @message.setter
     @overrides(BaseEvent)
     def message(self, value) -> None:
+        # 与 to_me 一样先完成原消息的检查，新赋值的消息不再解析
+        self._parse_message()
         self._raw_event["message"] = value
 
     @property
     @overrides(BaseEvent)
     def raw_message(self) -> Optional[str]:
-        return self._raw_event.get("raw_message")
+        raw_message = self._raw_event.get("raw_message")
+        if raw_message is None:
+            message = self._raw_event.get("message")
+            if isinstance(message, str):
+                return message
+        return raw_message
 
     @raw_message.setter
     @overrides(BaseEvent)
@@ -399,25 +707,11 @@ class Event(BaseEvent):
 
 
 class MessageSegment(BaseMessageSegment):
-
-    @overrides(BaseMessageSegment)
-    def __init__(self, type: str, data: Dict[str, Union[str, list]]) -> None:
-        if type == "text":
-            data["text"] = unescape(data["text"])
-        super().__init__(type=type, data=data)
+    __slots__ = ()
 
     @overrides(BaseMessageSegment)
     def __str__(self):
-        type_ = self.type
-        data = self.data.copy()
-
-        # process special types
-        if type_ == "text":
-            return escape(data.get("text", ""), escape_comma=False)
-
-        params = ",".join(
-            [f"{k}={escape(str(v))}" for k, v in data.items() if v is not None])
-        return f"[CQ:{type_}{',' if params else ''}{params}]"
+        return dump_segment(self.type, self.data)
 
     @overrides(BaseMessageSegment)
     def __add__(self, other) -> "Message":
@@ -576,40 +870,23 @@ class MessageSegment(BaseMessageSegment):
 
 class Message(BaseMessage):
 
+    @overrides(BaseMessage)
+    def __str__(self):
+        if self._str is None:
+            self._str = dumps(self)
+        return self._str
+
     @staticmethod
     @overrides(BaseMessage)
     def _construct(msg: Union[str, dict, list]) -> Iterable[MessageSegment]:
         if isinstance(msg, dict):
-            yield MessageSegment(msg["type"], msg.get("data") or {})
+            yield MessageSegment(sys.intern(msg["type"]), msg.get("data") or {})
             return
         elif isinstance(msg, list):
             for seg in msg:
-                yield MessageSegment(seg["type"], seg.get("data") or {})
+                yield MessageSegment(sys.intern(seg["type"]),
+                                     seg.get("data") or {})
             return
 
-        def _iter_message(msg: str) -> Iterable[Tuple[str, str]]:
-            text_begin = 0
-            for cqcode in re.finditer(
-                    r"\[CQ:(?P<type>[a-zA-Z0-9-_.]+)"
-                    r"(?P<params>"
-                    r"(?:,[a-zA-Z0-9-_.]+=?[^,\]]*)*"
-                    r"),?\]", msg):
-                yield "text", unescape(msg[text_begin:cqcode.pos +
-                                           cqcode.start()])
-                text_begin = cqcode.pos + cqcode.end()
-                yield cqcode.group("type"), cqcode.group("params").lstrip(",")
-            yield "text", unescape(msg[text_begin:])
-
-        for type_, data in _iter_message(msg):
-            if type_ == "text":
-                if data:
-                    # only yield non-empty text segment
-                    yield MessageSegment(type_, {"text": data})
-            else:
-                data = {
-                    k: v for k, v in map(
-                        lambda x: x.split("=", maxsplit=1),
-                        filter(lambda x: x, (
-                            x.lstrip() for x in data.split(","))))
-                }
-                yield MessageSegment(type_, data)
+        for type_, data in tokenize(msg):
+            yield MessageSegment(type_, data)
@@ -161,6 +161,77 @@ class Config(BaseConfig):
       是否以调试模式运行 NoneBot。
     """
 
+    event_workers: int = 8
+    """
+    - 类型: ``int``
+    - 默认值: ``8``
+    - 说明:
+      驱动器处理 WebSocket 事件的通道数。同一会话 (群或私聊) 的事件总是在同一通道内按顺序处理，不同通道并发处理。
+    """
+    event_queue_size: int = 1000
+    """
+    - 类型: ``int``
+    - 默认值: ``1000``
+    - 说明:
+      驱动器事件队列的最大长度，为 ``0`` 时不限制。
+    """
+    event_overflow_policy: str = "drop_priority"
+    """
+    - 类型: ``str``
+    - 默认值: ``"drop_priority"``
+    - 说明:
+      事件队列已满时的处理策略:
+
+      - ``block``: HTTP 上报 (``http_async_ack``) 时等待队列空出位置；WebSocket 连接不会暂停读取，按 ``drop_priority`` 处理
+      - ``drop_oldest``: 丢弃队列中最早的事件
+      - ``drop_priority``: 丢弃队列中优先级最低的事件 (``meta_event`` < ``notice`` < ``message`` < ``request``)，新事件优先级最低时丢弃新事件
+    """
+    event_drain_timeout: Optional[float] = 10.
+    """
+    - 类型: ``Optional[float]``
+    - 默认值: ``10.``
+    - 说明:
+      驱动器关闭时等待事件队列中剩余事件处理完毕的最长时间，单位: 秒。``None`` 为一直等待。
+    """
+    http_async_ack: bool = False
+    """
+    - 类型: ``bool``
+    - 默认值: ``False``
+    - 说明:
+      HTTP 方式上报事件时，是否在校验后将事件放入事件队列并立即返回 ``204`` ，不等待事件处理完毕。
+      开启后不使用快速操作 (``quick_operation_timeout``)。
+    """
+    http_bot_idle_timeout: Optional[float] = 600.
+    """
+    - 类型: ``Optional[float]``
+    - 默认值: ``600.``
+    - 说明:
+      HTTP 方式上报的 Bot 对象会被保留复用，超过该时间没有上报时移除，单位: 秒。``None`` 为一直保留。
+    """
+
+    executors: Dict[str, Dict[str, Any]] = {}
+    """
+    - 类型: ``Dict[str, Dict[str, Any]]``
+    - 默认值: ``{}``
+    - 说明:
+      ``nonebot.utils.run_sync`` 可使用的执行器，以名称为键，``type`` (``thread`` 或 ``process``) 及执行器参数为值。
+      名为 ``default`` 的执行器同时作为事件循环的默认执行器，只能为 ``thread`` 类型。执行器随驱动器启动创建，随驱动器关闭销毁。
+    - 示例:
+
+    .. code-block:: plain
+
+        EXECUTORS={"io": {"type": "thread", "max_workers": 32}, "render": {"type": "process", "max_workers": 4}}
+    """
+
+    json_backend: str = "auto"
+    """
+    - 类型: ``str``
+    - 默认值: ``"auto"``
+    - 说明:
+      驱动器与适配器收发数据时使用的 JSON 库，可选 ``auto`` 、 ``orjson`` 、 ``ujson`` 、 ``json`` 。
+      ``auto`` 时依次尝试已安装的 ``orjson`` 、 ``ujson`` ，都未安装时使用标准库 ``json`` 。
+    """
+
     # bot connection configs
     api_root: Dict[str, str] = {}
     """
@@ -188,6 +259,57 @@ class Config(BaseConfig):
     - 说明:
       API 请求所需密钥，会在调用 API 时在请求头中携带。
     """
+    api_max_connections: Optional[int] = 100
+    """
+    - 类型: ``Optional[int]``
+    - 默认值: ``100``
+    - 说明:
+      HTTP 方式调用 API 时每个上报地址连接池的最大连接数，``None`` 为不限制。
+    """
+    api_max_keepalive: Optional[int] = 20
+    """
+    - 类型: ``Optional[int]``
+    - 默认值: ``20``
+    - 说明:
+      HTTP 方式调用 API 时每个上报地址连接池保持的最大空闲连接数，``None`` 为不限制。
+    """
+    api_http2: bool = False
+    """
+    - 类型: ``bool``
+    - 默认值: ``False``
+    - 说明:
+      HTTP 方式调用 API 时是否使用 HTTP/2，需要安装 ``h2`` 。
+    """
+    quick_operation_timeout: Optional[float] = None
+    """
+    - 类型: ``Optional[float]``
+    - 默认值: ``None``
+    - 说明:
+      HTTP 方式上报消息事件时，等待事件处理发出首条回复的最长时间，单位: 秒。
+      在此期间对该事件的首条 ``bot.send`` 回复将作为快速操作直接在上报请求的响应中返回，不再另外调用 API。
+      ``None`` 为不使用快速操作。
+    """
+
+    api_cache_ttl: Dict[str, float] = {}
+    """
+    - 类型: ``Dict[str, float]``
+    - 默认值: ``{}``
+    - 说明:
+      以 API 名为键，结果缓存时间 (秒) 为值的字典，仅用于只读 API。相同的调用同时进行时只发送一次请求。
+      收到群成员增加、减少及管理员变动通知时会清除该群的缓存。默认不缓存。
+    - 示例:
+
+    .. code-block:: plain
+
+        API_CACHE_TTL={"get_group_info": 300, "get_group_member_info": 60, "get_stranger_info": 600}
+    """
+    api_cache_size: int = 1024
+    """
+    - 类型: ``int``
+    - 默认值: ``1024``
+    - 说明:
+      每个 Bot 最多缓存的 API 结果条数，超出时淘汰最久未使用的结果。
+    """
 
     # bot runtime configs
     superusers: Set[int] = set()
@@ -2,10 +2,190 @@
 # -*- coding: utf-8 -*-
 
 import abc
+import time
+import asyncio
+from collections import deque
 
 from nonebot.log import logger
+from nonebot.message import handle_event
 from nonebot.config import Env, Config
-from nonebot.typing import Bot, Dict, Type, Union, Optional, Callable
+from nonebot.typing import Bot, Dict, List, Type, Deque, Tuple, Union, Event, Optional, Callable
+
+_EVENT_PRIORITY = {"meta_event": 0, "notice": 1, "message": 2, "request": 3}
+
+
+class EventQueue(object):
+    """
+    驱动器的事件队列。
+
+    事件按 ``(self_id, group_id or user_id)`` 分配到 ``workers`` 个处理通道，
+    同一会话的事件在同一通道内按顺序处理，不同通道之间并发处理，
+    读取连接的循环也不会被事件处理阻塞。
+    所有通道共享 ``maxsize`` 长度限制，队列满时根据 ``overflow`` 策略等待或丢弃事件。
+    关闭时最多等待 ``drain_timeout`` 秒处理完剩余事件。
+
+    ``processed`` 、 ``total_wait`` 与 ``max_wait`` 记录已处理事件数及事件在队列中等待的时间 (秒)。
+    """
+
+    def __init__(self,
+                 workers: int,
+                 maxsize: int = 0,
+                 overflow: str = "drop_priority",
+                 drain_timeout: Optional[float] = None):
+        if overflow not in ("block", "drop_oldest", "drop_priority"):
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.workers = max(workers, 1)
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.drain_timeout = drain_timeout
+        self.dropped = 0
+        self.processed = 0
+        self.total_wait = 0.
+        self.max_wait = 0.
+        self._seq = 0
+        self._size = 0
+        self._unfinished = 0
+        self._finished: Optional[asyncio.Event] = None
+        self._lanes: List[Deque[Tuple[int, float, Bot, Event]]] = [
+            deque() for _ in range(self.workers)
+        ]
+        self._tasks: List[asyncio.Task] = []
+        self._not_empty: List[asyncio.Condition] = []
+        self._not_full: Optional[asyncio.Condition] = None
+
+    def qsize(self) -> int:
+        return self._size
+
+    def full(self) -> bool:
+        return 0 < self.maxsize <= self._size
+
+    @property
+    def average_wait(self) -> float:
+        return self.total_wait / self.processed if self.processed else 0.
+
+    def get_lane(self, event: Event) -> int:
+        return hash(
+            (event.self_id, event.group_id or event.user_id)) % self.workers
+
+    async def start(self):
+        lock = asyncio.Lock()
+        self._finished = asyncio.Event()
+        self._finished.set()
+        self._not_full = asyncio.Condition(lock)
+        self._not_empty = [asyncio.Condition(lock) for _ in range(self.workers)]
+        self._tasks = [
+            asyncio.create_task(self._work(lane))
+            for lane in range(self.workers)
+        ]
+
+    async def join(self):
+        """等待已入队的事件全部处理完毕"""
+        if self._finished is not None:
+            await self._finished.wait()
+
+    async def stop(self):
+        if self._tasks and self._unfinished:
+            logger.info(f"Waiting for {self._unfinished} queued events...")
+            try:
+                await asyncio.wait_for(self.join(), self.drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Event queue stopped with {self._unfinished} "
+                               "events unfinished")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._not_empty.clear()
+        self._not_full = None
+
+    async def put(self, bot: Bot, event: Event, block: bool = True):
+        """
+        放入事件。
+
+        ``block`` 为 ``False`` 时即使策略为 ``block`` 也不等待，按 ``drop_priority`` 处理；
+        读取连接的循环应使用 ``block=False`` ，以免等待期间无法收到 API 调用结果导致队列无法消化。
+        """
+        if self._not_full is None:
+            # 队列未启动时直接处理
+            await handle_event(bot, event)
+            return
+
+        async with self._not_full:
+            if self.full():
+                if self.overflow == "block" and block:
+                    await self._not_full.wait_for(lambda: not self.full())
+                elif self.overflow == "drop_oldest":
+                    self._drop_oldest()
+                elif not self._drop_lower(event):
+                    self._drop(event)
+                    return
+            lane = self.get_lane(event)
+            self._seq += 1
+            self._lanes[lane].append(
+                (self._seq, asyncio.get_running_loop().time(), bot, event))
+            self._size += 1
+            self._unfinished += 1
+            self._finished.clear()
+            self._not_empty[lane].notify()
+
+    def _task_done(self):
+        self._unfinished -= 1
+        if not self._unfinished:
+            self._finished.set()
+
+    def _drop(self, event: Event):
+        self.dropped += 1
+        logger.warning(f"Event queue is full, event {event.name} dropped")
+
+    def _drop_oldest(self):
+        lane = min((lane for lane in self._lanes if lane),
+                   key=lambda lane: lane[0][0])
+        self._size -= 1
+        self._task_done()
+        self._drop(lane.popleft()[3])
+
+    def _drop_lower(self, event: Event) -> bool:
+        priority = _EVENT_PRIORITY.get(event.type, 0)
+        lowest = None
+        for lane in self._lanes:
+            for index, (seq, _, _, queued) in enumerate(lane):
+                queued_priority = _EVENT_PRIORITY.get(queued.type, 0)
+                if queued_priority > priority:
+                    continue
+                if lowest is None or (queued_priority, seq) < lowest[:2]:
+                    lowest = (queued_priority, seq, lane, index)
+        if lowest is None:
+            return False
+        _, _, lane, index = lowest
+        dropped = lane[index][3]
+        del lane[index]
+        self._size -= 1
+        self._task_done()
+        self._drop(dropped)
+        return True
+
+    async def _work(self, lane: int):
+        assert self._not_empty and self._not_full
+        queue = self._lanes[lane]
+        not_empty = self._not_empty[lane]
+        loop = asyncio.get_running_loop()
+        while True:
+            async with not_empty:
+                await not_empty.wait_for(lambda: bool(queue))
+                _, enqueued_at, bot, event = queue.popleft()
+                self._size -= 1
+                self._not_full.notify()
+            wait = loop.time() - enqueued_at
+            self.processed += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            try:
+                await handle_event(bot, event)
+            except Exception as e:
+                logger.error(f"Failed to handle event {event.name}")
+                logger.exception(e)
+            finally:
+                self._task_done()
 
 
 class BaseDriver(abc.ABC):
@@ -16,6 +196,13 @@ class BaseDriver(abc.ABC):
         self.env = env.environment
         self.config = config
         self._clients: Dict[str, Bot] = {}
+        self._http_bots: Dict[Tuple[str, str], Bot] = {}
+        self._http_bots_seen: Dict[Tuple[str, str], float] = {}
+        self._http_bots_swept = time.monotonic()
+        self.event_queue = EventQueue(config.event_workers,
+                                      config.event_queue_size,
+                                      config.event_overflow_policy,
+                                      config.event_drain_timeout)
 
     @classmethod
     def register_adapter(cls, name: str, adapter: Type[Bot]):
@@ -44,7 +231,46 @@ class BaseDriver(abc.ABC):
 
     @property
     def bots(self) -> Dict[str, Bot]:
-        return self._clients
+        """所有 Bot 对象，同一 ID 同时存在 WebSocket 与 HTTP 连接时使用 WebSocket 连接"""
+        if not self._http_bots:
+            return self._clients
+        bots = {self_id: bot for (_, self_id), bot in self._http_bots.items()}
+        bots.update(self._clients)
+        return bots
+
+    def _get_http_bot(self, adapter: str, self_id: str) -> Bot:
+        """
+        获取 HTTP 上报使用的 Bot 对象，同一适配器与 ID 复用同一对象。
+
+        超过 ``http_bot_idle_timeout`` 秒没有上报的对象会被移除，检查每隔相同时间进行一次。
+        """
+        now = time.monotonic()
+        key = (adapter, self_id)
+        bot = self._http_bots.get(key)
+        if bot is None:
+            BotClass = self._adapters[adapter]
+            bot = BotClass(self, "http", self.config, self_id)
+            self._http_bots[key] = bot
+            logger.debug(f"HTTP bot {self_id} of adapter {adapter} created")
+        self._http_bots_seen[key] = now
+
+        timeout = self.config.http_bot_idle_timeout
+        if timeout is not None and now - self._http_bots_swept >= timeout:
+            self._http_bots_swept = now
+            for idle_key, seen in list(self._http_bots_seen.items()):
+                if now - seen > timeout:
+                    del self._http_bots[idle_key]
+                    del self._http_bots_seen[idle_key]
+                    logger.debug(f"Idle HTTP bot {idle_key[1]} removed")
+        return bot
+
+    async def _startup_adapters(self):
+        for adapter in self._adapters.values():
+            await adapter.startup(self)
+
+    async def _shutdown_adapters(self):
+        for adapter in self._adapters.values():
+            await adapter.shutdown(self)
 
     @abc.abstractmethod
     def on_startup(self, func: Callable) -> Callable:
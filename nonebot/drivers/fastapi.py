@@ -2,17 +2,16 @@
 # -*- coding: utf-8 -*-
 
 import hmac
-import json
 import logging
 
 import uvicorn
 from fastapi.responses import Response
-from fastapi import Body, status, Header, FastAPI, Depends, HTTPException
+from fastapi import status, Header, Request, FastAPI, Depends, HTTPException
 from starlette.websockets import WebSocketDisconnect, WebSocket as FastAPIWebSocket
 
 from nonebot.log import logger
 from nonebot.config import Env, Config
-from nonebot.utils import DataclassEncoder
+from nonebot.utils import json_loads, json_dumps, json_dumpb
 from nonebot.drivers import BaseDriver, BaseWebSocket
 from nonebot.typing import Optional, Callable, overrides
 
@@ -46,6 +45,11 @@ class Driver(BaseDriver):
         self._server_app.websocket("/{adapter}/ws")(self._handle_ws_reverse)
         self._server_app.websocket("/{adapter}/ws/")(self._handle_ws_reverse)
 
+        self.on_startup(self.event_queue.start)
+        self.on_startup(self._startup_adapters)
+        self.on_shutdown(self.event_queue.stop)
+        self.on_shutdown(self._shutdown_adapters)
+
     @property
     @overrides(BaseDriver)
     def type(self) -> str:
@@ -119,7 +123,7 @@ class Driver(BaseDriver):
     @overrides(BaseDriver)
     async def _handle_http(self,
                            adapter: str,
-                           data: dict = Body(...),
+                           request: Request,
                            x_self_id: Optional[str] = Header(None),
                            x_signature: Optional[str] = Header(None)):
         # 检查self_id
@@ -128,6 +132,8 @@ class Driver(BaseDriver):
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                                 detail="Missing X-Self-ID Header")
 
+        body = await request.body()
+
         # 检查签名
         secret = self.config.secret
         if secret:
@@ -135,13 +141,20 @@ class Driver(BaseDriver):
                 logger.warning("Missing Signature Header")
                 raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                                     detail="Missing Signature")
-            sig = hmac.new(secret.encode("utf-8"),
-                           json.dumps(data).encode(), "sha1").hexdigest()
-            if x_signature != "sha1=" + sig:
+            # 对收到的原始数据计算签名，避免重新序列化
+            sig = hmac.new(secret.encode("utf-8"), body, "sha1").hexdigest()
+            if not hmac.compare_digest(x_signature.encode("utf-8"),
+                                       f"sha1={sig}".encode("utf-8")):
                 logger.warning("Signature Header is invalid")
                 raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                                     detail="Signature is invalid")
 
+        try:
+            data = json_loads(body)
+        except ValueError:
+            logger.warning("Data received is invalid")
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+
         if not isinstance(data, dict):
             logger.warning("Data received is invalid")
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
@@ -150,16 +163,19 @@ class Driver(BaseDriver):
             logger.warning("There's already a reverse websocket api connection,"
                            "so the event may be handled twice.")
 
-        # 创建 Bot 对象
+        # 获取 Bot 对象
         if adapter in self._adapters:
-            BotClass = self._adapters[adapter]
-            bot = BotClass(self, "http", self.config, x_self_id)
+            bot = self._get_http_bot(adapter, x_self_id)
         else:
             logger.warning("Unknown adapter")
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                                 detail="adapter not found")
 
-        await bot.handle_message(data)
+        result = await bot.handle_message(data)
+        if result:
+            return Response(json_dumpb(result),
+                            status.HTTP_200_OK,
+                            media_type="application/json")
         return Response("", 204)
 
     @overrides(BaseDriver)
@@ -210,7 +226,10 @@ class Driver(BaseDriver):
 
                 await bot.handle_message(data)
         finally:
-            del self._clients[x_self_id]
+            await bot.handle_disconnect()
+            # 同一 ID 的新连接可能已经替换了该 Bot
+            if self._clients.get(x_self_id) is bot:
+                del self._clients[x_self_id]
 
 
 class WebSocket(BaseWebSocket):
@@ -238,7 +257,12 @@ class WebSocket(BaseWebSocket):
     async def receive(self) -> Optional[dict]:
         data = None
         try:
-            data = await self.websocket.receive_json()
+            message = await self.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            # 二进制帧直接解析，无需先解码为字符串
+            text = message.get("text")
+            data = json_loads(text if text is not None else message["bytes"])
             if not isinstance(data, dict):
                 data = None
                 raise ValueError
@@ -252,5 +276,5 @@ class WebSocket(BaseWebSocket):
 
     @overrides(BaseWebSocket)
     async def send(self, data: dict) -> None:
-        text = json.dumps(data, cls=DataclassEncoder)
+        text = json_dumps(data)
         await self.websocket.send({"type": "websocket.send", "text": text})
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import typing
+import inspect
+
+from nonebot.typing import Bot, Type, Event, Tuple, Union, Optional, Callable, Awaitable
+
+
+class Handler:
+    """事件处理函数的包装
+
+    在注册时解析一次处理函数 ``bot`` 参数的类型注解，运行时只需进行 ``isinstance`` 判断。
+    """
+    __slots__ = ("func", "_bot_types")
+
+    def __init__(self, func: Callable[[Bot, Event, dict], Awaitable[None]]):
+        self.func = func
+        self._bot_types: Optional[Tuple[Type[Bot], ...]] = None
+        try:
+            self._bot_types = self._get_bot_types()
+        except NameError:
+            # 注解引用了尚未定义的名称，推迟到首次运行时解析
+            pass
+
+    def __repr__(self) -> str:
+        return f"<Handler {self.func!r}>"
+
+    def __call__(self, bot: Bot, event: Event, state: dict):
+        return self.func(bot, event, state)
+
+    @property
+    def bot_types(self) -> Tuple[Type[Bot], ...]:
+        """处理函数接受的 Bot 类型，为空时接受所有 Bot"""
+        if self._bot_types is None:
+            self._bot_types = self._get_bot_types()
+        return self._bot_types
+
+    def accepts(self, bot: Bot) -> bool:
+        bot_types = self.bot_types
+        return not bot_types or isinstance(bot, bot_types)
+
+    def _get_bot_types(self) -> Tuple[Type[Bot], ...]:
+        BotType = typing.get_type_hints(self.func).get("bot")
+        if getattr(BotType, "__origin__", None) is Union:
+            types = BotType.__args__
+        else:
+            types = (BotType,)
+        if not all(inspect.isclass(t) for t in types):
+            return ()
+        return tuple(types)
@@ -1,32 +1,183 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import typing
-import inspect
+import time
+import heapq
+import asyncio
+from itertools import count
 from functools import wraps
-from datetime import datetime
+from datetime import datetime, timedelta
 from collections import defaultdict
 from contextvars import Context, ContextVar, copy_context
 
+from nonebot.log import logger
 from nonebot.rule import Rule
-from nonebot.permission import Permission, USER
-from nonebot.typing import Type, List, Dict, Union, Callable, Optional, NoReturn
+from nonebot.handler import Handler as HandlerClass
+from nonebot.permission import Permission
+from nonebot.typing import Type, List, Dict, Tuple, Union, Callable, Optional, NoReturn
 from nonebot.typing import Bot, Event, Handler, Message, ArgsParser, MessageSegment
 from nonebot.exception import PausedException, RejectedException, FinishedException
 
 matchers: Dict[int, List[Type["Matcher"]]] = defaultdict(list)
+_matchers_index: Dict[Tuple[str, str], Dict[int, List[Type["Matcher"]]]] = \
+    defaultdict(lambda: defaultdict(list))
+_expire_heap: List[Tuple[float, int, Type["Matcher"]]] = []
+_expire_seq = count()
+_sweeper: Optional[asyncio.Task] = None
 current_bot: ContextVar = ContextVar("current_bot")
 current_event: ContextVar = ContextVar("current_event")
 
 
+def get_matchers(type_: str,
+                 detail_type: str = "") -> Dict[int, List[Type["Matcher"]]]:
+    """获取可能响应该类型事件的 Matcher，按优先级分组
+
+    Args:
+        type_ (str): 事件类型
+        detail_type (str): 事件详细类型
+
+    Returns:
+        Dict[int, List[Type["Matcher"]]]: 以优先级为键的 Matcher 列表
+    """
+    result: Dict[int, List[Type["Matcher"]]] = defaultdict(list)
+    keys = dict.fromkeys([("", ""), (type_, ""), ("", detail_type),
+                          (type_, detail_type)])
+    for key in keys:
+        if key not in _matchers_index:
+            continue
+        for priority, matcher_list in _matchers_index[key].items():
+            result[priority].extend(matcher_list)
+    return result
+
+
+class SessionStore:
+    """暂停中的会话，以 (type, self_id, user_id, group_id) 为键保存等待继续运行的 Matcher 实例
+
+    会话只由与暂停时类型相同的事件继续运行。
+
+    过期时间使用单调时钟，并存入最小堆中，由后台任务按时清理。
+    """
+    _sessions: Dict[Tuple[str, str, Optional[int], Optional[int]],
+                    Dict["Matcher", float]] = {}
+    _heap: List[Tuple[float, int, Tuple[str, str, Optional[int], Optional[int]],
+                      "Matcher"]] = []
+    _seq = count()
+    evicted: int = 0
+
+    @staticmethod
+    def get_key(event: Event) -> Tuple[str, str, Optional[int], Optional[int]]:
+        return event.type, event.self_id, event.user_id, event.group_id
+
+    @classmethod
+    def live(cls) -> int:
+        """当前存活的会话数"""
+        return sum(map(len, cls._sessions.values()))
+
+    @classmethod
+    def add(cls, event: Event, matcher: "Matcher", timeout: timedelta) -> None:
+        key = cls.get_key(event)
+        expire_time = time.monotonic() + timeout.total_seconds()
+        cls._sessions.setdefault(key, {})[matcher] = expire_time
+        heapq.heappush(cls._heap, (expire_time, next(cls._seq), key, matcher))
+
+    @classmethod
+    def get(cls, event: Event) -> List["Matcher"]:
+        """获取事件对应的所有会话，已过期的会话将被移除"""
+        key = cls.get_key(event)
+        sessions = cls._sessions.get(key)
+        if not sessions:
+            return []
+        now = time.monotonic()
+        for matcher, expire_time in list(sessions.items()):
+            if now > expire_time:
+                cls._discard(key, matcher)
+                cls.evicted += 1
+        return list(cls._sessions.get(key, ()))
+
+    @classmethod
+    def remove(cls, event: Event, matcher: "Matcher") -> bool:
+        return cls._discard(cls.get_key(event), matcher)
+
+    @classmethod
+    def expire(cls, now: Optional[float] = None) -> int:
+        """移除所有已过期的会话
+
+        Returns:
+            int: 本次移除的会话数
+        """
+        now = time.monotonic() if now is None else now
+        evicted = 0
+        while cls._heap and cls._heap[0][0] <= now:
+            expire_time, _, key, matcher = heapq.heappop(cls._heap)
+            # skip entries of sessions that have been resumed or re-added
+            if cls._sessions.get(key, {}).get(matcher) == expire_time:
+                cls._discard(key, matcher)
+                evicted += 1
+        cls.evicted += evicted
+        return evicted
+
+    @classmethod
+    def _discard(cls, key: Tuple[str, str, Optional[int], Optional[int]],
+                 matcher: "Matcher") -> bool:
+        sessions = cls._sessions.get(key)
+        if not sessions or matcher not in sessions:
+            return False
+        del sessions[matcher]
+        if not sessions:
+            del cls._sessions[key]
+        return True
+
+
+def expire_matchers(now: Optional[float] = None) -> int:
+    """移除所有已过期的临时 Matcher
+
+    Returns:
+        int: 本次移除的 Matcher 数
+    """
+    now = time.monotonic() if now is None else now
+    evicted = 0
+    while _expire_heap and _expire_heap[0][0] <= now:
+        _, _, matcher = heapq.heappop(_expire_heap)
+        matcher.destroy()
+        evicted += 1
+    return evicted
+
+
+async def _sweep(interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        now = time.monotonic()
+        sessions = SessionStore.expire(now)
+        temp_matchers = expire_matchers(now)
+        if sessions or temp_matchers:
+            logger.debug(f"Expired {sessions} sessions "
+                         f"and {temp_matchers} temp matchers")
+
+
+async def start_sweeper(interval: float = 1.) -> None:
+    """启动后台任务，定时清理过期的会话与临时 Matcher"""
+    global _sweeper
+    if _sweeper is None or _sweeper.done():
+        _sweeper = asyncio.create_task(_sweep(interval))
+
+
+async def stop_sweeper() -> None:
+    """停止过期清理后台任务"""
+    global _sweeper
+    if _sweeper is not None:
+        _sweeper.cancel()
+        _sweeper = None
+
+
 class Matcher:
     """`Matcher`类
     """
 
     type: str = ""
+    detail_type: str = ""
     rule: Rule = Rule()
     permission: Permission = Permission()
-    handlers: List[Handler] = []
+    handlers: Tuple[HandlerClass, ...] = ()
     temp: bool = False
     expire_time: Optional[datetime] = None
     priority: int = 1
@@ -39,7 +190,7 @@ class Matcher:
     def __init__(self):
         """实例化 Matcher 以便运行
         """
-        self.handlers = self.handlers.copy()
+        self.handler_index = 0
         self.state = self._default_state.copy()
 
     def __repr__(self) -> str:
@@ -59,6 +210,7 @@ class Matcher:
             priority: int = 1,
             block: bool = False,
             *,
+            detail_type: str = "",
             default_state: Optional[dict] = None,
             expire_time: Optional[datetime] = None) -> Type["Matcher"]:
         """创建新的 Matcher
@@ -67,12 +219,16 @@ class Matcher:
             Type["Matcher"]: 新的 Matcher 类
         """
 
+        handlers_ = tuple(h if isinstance(h, HandlerClass) else HandlerClass(h)
+                          for h in handlers or [])
+
         NewMatcher = type(
             "Matcher", (Matcher,), {
                 "type": type_,
+                "detail_type": detail_type,
                 "rule": rule,
                 "permission": permission,
-                "handlers": handlers or [],
+                "handlers": handlers_,
                 "temp": temp,
                 "expire_time": expire_time,
                 "priority": priority,
@@ -81,12 +237,28 @@ class Matcher:
             })
 
         matchers[priority].append(NewMatcher)
+        _matchers_index[(type_, detail_type)][priority].append(NewMatcher)
+        if expire_time:
+            heapq.heappush(_expire_heap,
+                           (time.monotonic() +
+                            (expire_time - datetime.now()).total_seconds(),
+                            next(_expire_seq), NewMatcher))
 
         return NewMatcher
 
+    @classmethod
+    def destroy(cls) -> None:
+        """从事件响应器列表中移除该 Matcher"""
+        if cls in matchers[cls.priority]:
+            matchers[cls.priority].remove(cls)
+        index = _matchers_index[(cls.type, cls.detail_type)][cls.priority]
+        if cls in index:
+            index.remove(cls)
+
     @classmethod
     async def check_perm(cls, bot: Bot, event: Event) -> bool:
         return (event.type == (cls.type or event.type) and
+                event.detail_type == (cls.detail_type or event.detail_type) and
                 await cls.permission(bot, event))
 
     @classmethod
@@ -111,7 +283,7 @@ class Matcher:
         """直接处理消息事件"""
 
         def _decorator(func: Handler) -> Handler:
-            cls.handlers.append(func)
+            cls.handlers += (HandlerClass(func),)
             return func
 
         return _decorator
@@ -125,11 +297,11 @@ class Matcher:
 
         if cls.handlers:
             # 已有前置handlers则接受一条新的消息，否则视为接收初始消息
-            cls.handlers.append(_receive)
+            cls.handlers += (HandlerClass(_receive),)
 
         def _decorator(func: Handler) -> Handler:
-            if not cls.handlers or cls.handlers[-1] is not func:
-                cls.handlers.append(func)
+            if not cls.handlers or cls.handlers[-1].func is not func:
+                cls.handlers += (HandlerClass(func),)
 
             return func
 
@@ -159,19 +331,18 @@ class Matcher:
             else:
                 state[state["_current_key"]] = str(event.message)
 
-        cls.handlers.append(_key_getter)
-        cls.handlers.append(_key_parser)
+        cls.handlers += (HandlerClass(_key_getter), HandlerClass(_key_parser))
 
         def _decorator(func: Handler) -> Handler:
-            if not hasattr(cls.handlers[-1], "__wrapped__"):
-                parser = cls.handlers.pop()
+            if not hasattr(cls.handlers[-1].func, "__wrapped__"):
+                parser = cls.handlers[-1]
 
                 @wraps(func)
                 async def wrapper(bot: Bot, event: Event, state: dict):
                     await parser(bot, event, state)
                     await func(bot, event, state)
 
-                cls.handlers.append(wrapper)
+                cls.handlers = cls.handlers[:-1] + (HandlerClass(wrapper),)
 
             return func
 
@@ -218,38 +389,19 @@ class Matcher:
             # Refresh preprocess state
             self.state.update(state)
 
-            for _ in range(len(self.handlers)):
-                handler = self.handlers.pop(0)
-                annotation = typing.get_type_hints(handler)
-                BotType = annotation.get("bot")
-                if BotType and inspect.isclass(BotType) and not isinstance(
-                        bot, BotType):
+            # 会话恢复时从上次暂停处继续运行
+            while self.handler_index < len(self.handlers):
+                handler = self.handlers[self.handler_index]
+                self.handler_index += 1
+                if not handler.accepts(bot):
                     continue
                 await handler(bot, event, self.state)
 
         except RejectedException:
-            self.handlers.insert(0, handler)  # type: ignore
-            Matcher.new(
-                self.type,
-                Rule(),
-                USER(event.user_id, perm=self.permission),  # type:ignore
-                self.handlers,
-                temp=True,
-                priority=0,
-                block=True,
-                default_state=self.state,
-                expire_time=datetime.now() + bot.config.session_expire_timeout)
+            self.handler_index -= 1
+            SessionStore.add(event, self, bot.config.session_expire_timeout)
         except PausedException:
-            Matcher.new(
-                self.type,
-                Rule(),
-                USER(event.user_id, perm=self.permission),  # type:ignore
-                self.handlers,
-                temp=True,
-                priority=0,
-                block=True,
-                default_state=self.state,
-                expire_time=datetime.now() + bot.config.session_expire_timeout)
+            SessionStore.add(event, self, bot.config.session_expire_timeout)
         except FinishedException:
             pass
         finally:
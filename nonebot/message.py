@@ -5,8 +5,7 @@ import asyncio
 from datetime import datetime
 
 from nonebot.log import logger
-from nonebot.rule import TrieRule
-from nonebot.matcher import matchers
+from nonebot.matcher import SessionStore, get_matchers
 from nonebot.typing import Set, Type, Union, NoReturn
 from nonebot.typing import Bot, Event, Matcher, PreProcessor
 from nonebot.exception import IgnoredException, ExpiredException
@@ -55,6 +54,30 @@ async def _run_matcher(Matcher: Type[Matcher], bot: Bot, event: Event,
         raise _ExceptionContainer(exceptions)
 
 
+async def _run_session(matcher: Matcher, bot: Bot, event: Event,
+                       state: dict) -> bool:
+    try:
+        if not await matcher.check_perm(bot, event):
+            return False
+    except Exception as e:
+        logger.error(f"Permission check failed for session {matcher}. Ignored.")
+        logger.exception(e)
+        return False
+
+    # another event of the same session may have taken it during the check
+    if not SessionStore.remove(event, matcher):
+        return False
+
+    logger.info(f"Event will be handled by session {matcher}")
+    try:
+        logger.debug(f"Running matcher {matcher}")
+        await matcher.run(bot, event, state)
+    except Exception as e:
+        logger.error(f"Running matcher {matcher} failed.")
+        logger.exception(e)
+    return True
+
+
 async def handle_event(bot: Bot, event: Event):
     log_msg = f"{bot.type.upper()} Bot {event.self_id} [{event.name}]: "
     if event.type == "message":
@@ -62,7 +85,9 @@ async def handle_event(bot: Bot, event: Event):
         log_msg += str(event.user_id)
         if event.detail_type == "group":
             log_msg += f"@[群:{event.group_id}]: "
-        log_msg += repr(str(event.message))
+        raw_message = event.raw_message
+        log_msg += repr(
+            raw_message if raw_message is not None else str(event.message))
     elif event.type == "notice":
         log_msg += f"Notice {event.raw_event}"
     elif event.type == "request":
@@ -83,29 +108,36 @@ async def handle_event(bot: Bot, event: Event):
             logger.info(f"Event {event.name} is ignored")
             return
 
-    # Trie Match
-    _, _ = TrieRule.get_value(bot, event, state)
+    # Session Match
+    sessions = SessionStore.get(event)
+    if sessions:
+        results = await asyncio.gather(*[
+            _run_session(matcher, bot, event, state.copy())
+            for matcher in sessions
+        ])
+        if any(results):
+            logger.debug("Stop event propagation")
+            return
 
     break_flag = False
-    for priority in sorted(matchers.keys()):
+    candidates = get_matchers(event.type, event.detail_type)
+    for priority in sorted(candidates.keys()):
         if break_flag:
             break
 
         pending_tasks = [
             _run_matcher(matcher, bot, event, state.copy())
-            for matcher in matchers[priority]
+            for matcher in candidates[priority]
         ]
 
         logger.debug(f"Checking for all matchers in priority {priority}...")
         results = await asyncio.gather(*pending_tasks, return_exceptions=True)
 
-        i = 0
-        for index, result in enumerate(results):
+        for matcher, result in zip(candidates[priority], results):
             if isinstance(result, _ExceptionContainer):
                 e_list = result.exceptions
                 if StopPropagation in e_list:
                     break_flag = True
                     logger.debug("Stop event propagation")
                 if ExpiredException in e_list:
-                    del matchers[priority][index - i]
-                    i += 1
+                    matcher.destroy()
@@ -2,8 +2,9 @@
 # -*- coding: utf-8 -*-
 
 import asyncio
+import inspect
 
-from nonebot.utils import run_sync
+from nonebot.utils import cost, is_fast, get_cost, run_sync
 from nonebot.typing import Bot, Event, Union, NoReturn, PermissionChecker
 
 
@@ -11,14 +12,18 @@ class Permission:
     __slots__ = ("checkers",)
 
     def __init__(self, *checkers: PermissionChecker) -> None:
-        self.checkers = list(checkers)
+        self.checkers = sorted(checkers, key=get_cost)
 
     async def __call__(self, bot: Bot, event: Event) -> bool:
         if not self.checkers:
             return True
-        results = await asyncio.gather(
-            *map(lambda c: c(bot, event), self.checkers))
-        return any(results)
+        for checker in self.checkers:
+            result = checker(bot, event)
+            if inspect.isawaitable(result):
+                result = await result
+            if result:
+                return True
+        return False
 
     def __and__(self, other) -> NoReturn:
         raise RuntimeError("And operation between Permissions is not allowed.")
@@ -28,25 +33,29 @@ class Permission:
         checkers = [*self.checkers]
         if isinstance(other, Permission):
             checkers.extend(other.checkers)
-        elif asyncio.iscoroutinefunction(other):
+        elif asyncio.iscoroutinefunction(other) or is_fast(other):
             checkers.append(other)
         else:
             checkers.append(run_sync(other))
         return Permission(*checkers)
 
 
+@cost(0)
 async def _message(bot: Bot, event: Event) -> bool:
     return event.type == "message"
 
 
+@cost(0)
 async def _notice(bot: Bot, event: Event) -> bool:
     return event.type == "notice"
 
 
+@cost(0)
 async def _request(bot: Bot, event: Event) -> bool:
     return event.type == "request"
 
 
+@cost(0)
 async def _metaevent(bot: Bot, event: Event) -> bool:
     return event.type == "meta_event"
 
@@ -59,6 +68,7 @@ METAEVENT = Permission(_metaevent)
 
 def USER(*user: int, perm: Permission = Permission()):
 
+    @cost(0)
     async def _user(bot: Bot, event: Event) -> bool:
         return event.type == "message" and event.user_id in user and await perm(
             bot, event)
@@ -66,20 +76,24 @@ def USER(*user: int, perm: Permission = Permission()):
     return Permission(_user)
 
 
+@cost(0)
 async def _private(bot: Bot, event: Event) -> bool:
     return event.type == "message" and event.detail_type == "private"
 
 
+@cost(0)
 async def _private_friend(bot: Bot, event: Event) -> bool:
     return (event.type == "message" and event.detail_type == "private" and
             event.sub_type == "friend")
 
 
+@cost(0)
 async def _private_group(bot: Bot, event: Event) -> bool:
     return (event.type == "message" and event.detail_type == "private" and
             event.sub_type == "group")
 
 
+@cost(0)
 async def _private_other(bot: Bot, event: Event) -> bool:
     return (event.type == "message" and event.detail_type == "private" and
             event.sub_type == "other")
@@ -91,20 +105,24 @@ PRIVATE_GROUP = Permission(_private_group)
 PRIVATE_OTHER = Permission(_private_other)
 
 
+@cost(0)
 async def _group(bot: Bot, event: Event) -> bool:
     return event.type == "message" and event.detail_type == "group"
 
 
+@cost(0)
 async def _group_member(bot: Bot, event: Event) -> bool:
     return (event.type == "message" and event.detail_type == "group" and
             event.sender.get("role") == "member")
 
 
+@cost(0)
 async def _group_admin(bot: Bot, event: Event) -> bool:
     return (event.type == "message" and event.detail_type == "group" and
             event.sender.get("role") == "admin")
 
 
+@cost(0)
 async def _group_owner(bot: Bot, event: Event) -> bool:
     return (event.type == "message" and event.detail_type == "group" and
             event.sender.get("role") == "owner")
@@ -116,6 +134,7 @@ GROUP_ADMIN = Permission(_group_admin)
 GROUP_OWNER = Permission(_group_owner)
 
 
+@cost(0)
 async def _superuser(bot: Bot, event: Event) -> bool:
     return event.type == "message" and event.user_id in bot.config.superusers
 
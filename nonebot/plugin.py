@@ -31,6 +31,7 @@ class Plugin(object):
 def on(rule: Union[Rule, RuleChecker] = Rule(),
        permission: Permission = Permission(),
        *,
+       detail_type: str = "",
        handlers: Optional[list] = None,
        temp: bool = False,
        priority: int = 1,
@@ -43,6 +44,7 @@ def on(rule: Union[Rule, RuleChecker] = Rule(),
                           priority=priority,
                           block=block,
                           handlers=handlers,
+                          detail_type=detail_type,
                           default_state=state)
     _tmp_matchers.add(matcher)
     return matcher
@@ -50,6 +52,7 @@ def on(rule: Union[Rule, RuleChecker] = Rule(),
 
 def on_metaevent(rule: Union[Rule, RuleChecker] = Rule(),
                  *,
+                 detail_type: str = "",
                  handlers: Optional[list] = None,
                  temp: bool = False,
                  priority: int = 1,
@@ -62,6 +65,7 @@ def on_metaevent(rule: Union[Rule, RuleChecker] = Rule(),
                           priority=priority,
                           block=block,
                           handlers=handlers,
+                          detail_type=detail_type,
                           default_state=state)
     _tmp_matchers.add(matcher)
     return matcher
@@ -70,6 +74,7 @@ def on_metaevent(rule: Union[Rule, RuleChecker] = Rule(),
 def on_message(rule: Union[Rule, RuleChecker] = Rule(),
                permission: Permission = Permission(),
                *,
+               detail_type: str = "",
                handlers: Optional[list] = None,
                temp: bool = False,
                priority: int = 1,
@@ -82,6 +87,7 @@ def on_message(rule: Union[Rule, RuleChecker] = Rule(),
                           priority=priority,
                           block=block,
                           handlers=handlers,
+                          detail_type=detail_type,
                           default_state=state)
     _tmp_matchers.add(matcher)
     return matcher
@@ -89,6 +95,7 @@ def on_message(rule: Union[Rule, RuleChecker] = Rule(),
 
 def on_notice(rule: Union[Rule, RuleChecker] = Rule(),
               *,
+              detail_type: str = "",
               handlers: Optional[list] = None,
               temp: bool = False,
               priority: int = 1,
@@ -101,6 +108,7 @@ def on_notice(rule: Union[Rule, RuleChecker] = Rule(),
                           priority=priority,
                           block=block,
                           handlers=handlers,
+                          detail_type=detail_type,
                           default_state=state)
     _tmp_matchers.add(matcher)
     return matcher
@@ -108,6 +116,7 @@ def on_notice(rule: Union[Rule, RuleChecker] = Rule(),
 
 def on_request(rule: Union[Rule, RuleChecker] = Rule(),
                *,
+               detail_type: str = "",
                handlers: Optional[list] = None,
                temp: bool = False,
                priority: int = 1,
@@ -120,6 +129,7 @@ def on_request(rule: Union[Rule, RuleChecker] = Rule(),
                           priority=priority,
                           block=block,
                           handlers=handlers,
+                          detail_type=detail_type,
                           default_state=state)
     _tmp_matchers.add(matcher)
     return matcher
@@ -3,32 +3,40 @@
 
 import re
 import asyncio
+import inspect
 from itertools import product
+from collections import deque
+from weakref import WeakKeyDictionary
 
 from pygtrie import CharTrie
 
 from nonebot import get_driver
 from nonebot.log import logger
-from nonebot.utils import run_sync
-from nonebot.typing import Bot, Any, Dict, Event, Union, Tuple, NoReturn, RuleChecker
+from nonebot.utils import cost, is_fast, get_cost, run_sync
+from nonebot.typing import Bot, Any, Set, Dict, List, Event, Union, Tuple, NoReturn, RuleChecker
+from nonebot.typing import Match, Pattern
 
 
 class Rule:
     __slots__ = ("checkers",)
 
     def __init__(self, *checkers: RuleChecker) -> None:
-        self.checkers = list(checkers)
+        self.checkers = sorted(checkers, key=get_cost)
 
     async def __call__(self, bot: Bot, event: Event, state: dict) -> bool:
-        results = await asyncio.gather(
-            *map(lambda c: c(bot, event, state), self.checkers))
-        return all(results)
+        for checker in self.checkers:
+            result = checker(bot, event, state)
+            if inspect.isawaitable(result):
+                result = await result
+            if not result:
+                return False
+        return True
 
     def __and__(self, other: Union["Rule", RuleChecker]) -> "Rule":
         checkers = [*self.checkers]
         if isinstance(other, Rule):
             checkers.extend(other.checkers)
-        elif asyncio.iscoroutinefunction(other):
+        elif asyncio.iscoroutinefunction(other) or is_fast(other):
             checkers.append(other)
         else:
             checkers.append(run_sync(other))
@@ -39,8 +47,11 @@ class Rule:
 
 
 class TrieRule:
+    """在规则首次需要时匹配前缀与后缀，每个事件只匹配一次"""
     prefix: CharTrie = CharTrie()
     suffix: CharTrie = CharTrie()
+    _values: "WeakKeyDictionary[Event, Tuple[Dict[str, Any], Dict[str, Any]]]" = \
+        WeakKeyDictionary()
 
     @classmethod
     def add_prefix(cls, prefix: str, value: Any):
@@ -59,9 +70,15 @@ class TrieRule:
     @classmethod
     def get_value(cls, bot: Bot, event: Event,
                   state: dict) -> Tuple[Dict[str, Any], Dict[str, Any]]:
-        if event.type != "message":
-            state["_prefix"] = {}
-            state["_suffix"] = {}
+        values = cls._values.get(event)
+        if values is None:
+            values = cls._values[event] = cls._match(event)
+        state["_prefix"], state["_suffix"] = values
+        return values
+
+    @classmethod
+    def _match(cls, event: Event) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        if event.type != "message" or not (cls.prefix or cls.suffix):
             return {}, {}
 
         prefix = None
@@ -74,9 +91,6 @@ class TrieRule:
             suffix = cls.suffix.longest_prefix(
                 message_r.data["text"].rstrip()[::-1])
 
-        state["_prefix"] = {prefix.key: prefix.value} if prefix else {}
-        state["_suffix"] = {suffix.key: suffix.value} if suffix else {}
-
         return ({
             prefix.key: prefix.value
         } if prefix else {}, {
@@ -84,11 +98,124 @@ class TrieRule:
         } if suffix else {})
 
 
+class KeywordRule:
+    """所有 keyword 规则共用的 Aho-Corasick 自动机，在规则首次需要时扫描纯文本，每个事件只扫描一次"""
+    keywords: Set[str] = set()
+    _values: "WeakKeyDictionary[Event, Set[str]]" = WeakKeyDictionary()
+    _goto: List[Dict[str, int]] = [{}]
+    _fail: List[int] = [0]
+    _output: List[Tuple[str, ...]] = [()]
+    _dirty: bool = False
+
+    @classmethod
+    def add_keyword(cls, keyword: str):
+        if keyword in cls.keywords:
+            return
+        cls.keywords.add(keyword)
+        cls._dirty = True
+
+    @classmethod
+    def _build(cls):
+        goto: List[Dict[str, int]] = [{}]
+        output: List[Tuple[str, ...]] = [()]
+        for keyword in cls.keywords:
+            node = 0
+            for char in keyword:
+                next_node = goto[node].get(char)
+                if next_node is None:
+                    goto.append({})
+                    output.append(())
+                    next_node = goto[node][char] = len(goto) - 1
+                node = next_node
+            output[node] += (keyword,)
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, next_node in goto[node].items():
+                queue.append(next_node)
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fail[next_node] = goto[state].get(char, 0)
+                output[next_node] += output[fail[next_node]]
+
+        cls._goto, cls._fail, cls._output = goto, fail, output
+        cls._dirty = False
+
+    @classmethod
+    def search(cls, text: str) -> Set[str]:
+        if cls._dirty:
+            cls._build()
+        goto, fail, output = cls._goto, cls._fail, cls._output
+        hits: Set[str] = {""} if text and "" in cls.keywords else set()
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                hits.update(output[node])
+        return hits
+
+    @classmethod
+    def get_value(cls, bot: Bot, event: Event, state: dict) -> Set[str]:
+        keywords = cls._values.get(event)
+        if keywords is None:
+            if event.type != "message" or not cls.keywords:
+                keywords = set()
+            else:
+                keywords = cls.search(event.plain_text or "")
+            cls._values[event] = keywords
+        state["_keyword"] = keywords
+        return keywords
+
+
+class RegexRule:
+    """所有 regex 规则共用的正则集合，在规则首次需要时匹配，每个事件只序列化一次消息并对每个不同的正则匹配一次"""
+    patterns: Dict[Tuple[str, int], Pattern] = {}
+    _values: "WeakKeyDictionary[Event, Dict[Tuple[str, int], Match]]" = \
+        WeakKeyDictionary()
+
+    @classmethod
+    def add_pattern(cls,
+                    regex: str,
+                    flags: Union[int, re.RegexFlag] = 0) -> Tuple[str, int]:
+        key = (regex, int(flags))
+        if key not in cls.patterns:
+            cls.patterns[key] = re.compile(regex, flags)
+        return key
+
+    @classmethod
+    def get_value(cls, bot: Bot, event: Event,
+                  state: dict) -> Dict[Tuple[str, int], Match]:
+        matched = cls._values.get(event)
+        if matched is None:
+            matched = cls._values[event] = cls._match(event)
+        state["_regex"] = matched
+        return matched
+
+    @classmethod
+    def _match(cls, event: Event) -> Dict[Tuple[str, int], Match]:
+        if event.type != "message" or not cls.patterns:
+            return {}
+
+        text = str(event.message)
+        matched = {}
+        for key, pattern in cls.patterns.items():
+            match = pattern.search(text)
+            if match:
+                matched[key] = match
+        return matched
+
+
 def startswith(msg: str) -> Rule:
     TrieRule.add_prefix(msg, (msg,))
 
+    @cost(0)
     async def _startswith(bot: Bot, event: Event, state: dict) -> bool:
-        return msg in state["_prefix"]
+        return msg in TrieRule.get_value(bot, event, state)[0]
 
     return Rule(_startswith)
 
@@ -96,16 +223,19 @@ def startswith(msg: str) -> Rule:
 def endswith(msg: str) -> Rule:
     TrieRule.add_suffix(msg, (msg,))
 
+    @cost(0)
     async def _endswith(bot: Bot, event: Event, state: dict) -> bool:
-        return msg in state["_suffix"]
+        return msg in TrieRule.get_value(bot, event, state)[1]
 
     return Rule(_endswith)
 
 
 def keyword(msg: str) -> Rule:
+    KeywordRule.add_keyword(msg)
 
+    @cost(0)
     async def _keyword(bot: Bot, event: Event, state: dict) -> bool:
-        return bool(event.plain_text and msg in event.plain_text)
+        return msg in KeywordRule.get_value(bot, event, state)
 
     return Rule(_keyword)
 
@@ -121,23 +251,36 @@ def command(command: Tuple[str, ...]) -> Rule:
         for start, sep in product(command_start, command_sep):
             TrieRule.add_prefix(f"{start}{sep.join(command)}", command)
 
+    @cost(0)
     async def _command(bot: Bot, event: Event, state: dict) -> bool:
-        return command in state["_prefix"].values()
+        return command in TrieRule.get_value(bot, event, state)[0].values()
 
     return Rule(_command)
 
 
 def regex(regex: str, flags: Union[int, re.RegexFlag] = 0) -> Rule:
-    pattern = re.compile(regex, flags)
+    """
+    匹配消息的正则，匹配成功时在 state 中存入 ``_matched`` (匹配到的字符串)、
+    ``_matched_groups`` 以及 ``_matched_dict`` 。
+    """
+    key = RegexRule.add_pattern(regex, flags)
 
+    @cost(0)
     async def _regex(bot: Bot, event: Event, state: dict) -> bool:
-        return bool(pattern.search(str(event.message)))
+        matched = RegexRule.get_value(bot, event, state).get(key)
+        if not matched:
+            return False
+        state["_matched"] = matched.group()
+        state["_matched_groups"] = matched.groups()
+        state["_matched_dict"] = matched.groupdict()
+        return True
 
     return Rule(_regex)
 
 
 def to_me() -> Rule:
 
+    @cost(0)
     async def _to_me(bot: Bot, event: Event, state: dict) -> bool:
         return bool(event.to_me)
 
@@ -22,8 +22,9 @@
 
 from types import ModuleType
 from typing import NoReturn, TYPE_CHECKING
-from typing import Any, Set, List, Dict, Type, Tuple, Mapping
+from typing import Any, Set, List, Dict, Type, Deque, Tuple, Mapping
 from typing import Union, TypeVar, Optional, Iterable, Callable, Awaitable
+from typing import Match, Pattern, Iterator
 
 # import some modules needed when checking types
 if TYPE_CHECKING:
@@ -120,13 +121,13 @@ Rule = TypeVar("Rule", bound="RuleClass")
 
   Rule 即判断是否响应事件的处理类。内部存储 RuleChecker ，返回全为 True 则响应事件。
 """
-RuleChecker = Callable[[Bot, Event, dict], Awaitable[bool]]
+RuleChecker = Callable[[Bot, Event, dict], Union[bool, Awaitable[bool]]]
 """
-:类型: `Callable[[Bot, Event, dict], Awaitable[bool]]`
+:类型: `Callable[[Bot, Event, dict], Union[bool, Awaitable[bool]]]`
 
 :说明:
 
-  RuleChecker 即判断是否响应事件的处理函数。
+  RuleChecker 即判断是否响应事件的处理函数。同步函数需经 ``nonebot.utils.fast`` 标记才会直接运行。
 """
 Permission = TypeVar("Permission", bound="PermissionClass")
 """
@@ -136,9 +137,9 @@ Permission = TypeVar("Permission", bound="PermissionClass")
 
   Permission 即判断是否响应消息的处理类。内部存储 PermissionChecker ，返回只要有一个 True 则响应消息。
 """
-PermissionChecker = Callable[[Bot, Event], Awaitable[bool]]
+PermissionChecker = Callable[[Bot, Event], Union[bool, Awaitable[bool]]]
 """
-:类型: `Callable[[Bot, Event], Awaitable[bool]]`
+:类型: `Callable[[Bot, Event], Union[bool, Awaitable[bool]]]`
 
 :说明:
 
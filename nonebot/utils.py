@@ -5,17 +5,157 @@ import json
 import asyncio
 import dataclasses
 from functools import wraps, partial
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
 
-from nonebot.typing import Any, Callable, Awaitable, overrides
+from nonebot.log import logger
+from nonebot.typing import Any, Dict, Union, Optional, Callable, Awaitable, overrides
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-def run_sync(func: Callable[..., Any]) -> Callable[..., Awaitable[Any]]:
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+_executors: Dict[str, Executor] = {}
+
+DEFAULT_COST = 10
+
+
+def cost(value: int) -> Callable[[Callable], Callable]:
+    """
+    :说明:
+
+      为 RuleChecker 或 PermissionChecker 声明开销提示。
+      ``Rule`` 与 ``Permission`` 在创建时按开销从小到大排列检查函数并依次运行，
+      结果确定后不再运行后续检查函数。未声明的检查函数开销为 ``DEFAULT_COST`` 。
+
+    :参数:
+
+      * ``value: int``: 开销，越小越先运行
+
+    :用法:
+
+    .. code-block:: python
+
+        @cost(100)
+        async def is_vip(bot: Bot, event: Event, state: dict) -> bool:
+            return await query_vip(event.user_id)
+
+    """
+
+    def _decorator(func: Callable) -> Callable:
+        func._nonebot_cost = value  # type: ignore
+        return func
+
+    return _decorator
+
+
+def get_cost(func: Callable) -> int:
+    return getattr(func, "_nonebot_cost", DEFAULT_COST)
+
+
+def fast(func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    :说明:
+
+      将同步的 RuleChecker 或 PermissionChecker 标记为无阻塞的快速函数。
+      标记后的函数直接在事件循环中运行，不再通过 ``run_sync`` 放入线程池；
+      未声明开销时视为开销为 ``0`` 。未标记的同步函数仍会通过 ``run_sync`` 运行。
+
+    :用法:
+
+    .. code-block:: python
+
+        rule = to_me() & fast(lambda bot, event, state: event.group_id in ALLOWED)
+
+    """
+    func._nonebot_fast = True  # type: ignore
+    if not hasattr(func, "_nonebot_cost"):
+        func._nonebot_cost = 0  # type: ignore
+    return func
+
+
+def is_fast(func: Callable[..., Any]) -> bool:
+    return getattr(func, "_nonebot_fast", False)
+
+
+def create_executors(config: Dict[str, Dict[str, Any]]) -> None:
+    """
+    :说明:
+
+      根据配置创建 ``run_sync`` 使用的执行器，名为 ``default`` 的执行器同时作为事件循环的默认执行器，必须为线程池。
+
+    :参数:
+
+      * ``config: Dict[str, Dict[str, Any]]``: 以执行器名为键，``{"type": "thread" | "process", "max_workers": int}`` 为值的字典
+    """
+    # 创建任何执行器之前检查配置，避免出错时遗留已创建的执行器
+    for name, options in config.items():
+        type_ = options.get("type", "thread")
+        if type_ not in ("thread", "process"):
+            raise ValueError(f"Unknown executor type: {type_}")
+        if name == "default" and type_ != "thread":
+            raise ValueError(
+                'Executor "default" is used as the event loop default '
+                f'executor and must be of type "thread", not "{type_}"')
+
+    for name, options in config.items():
+        options = dict(options)
+        type_ = options.pop("type", "thread")
+        if type_ == "thread":
+            options.setdefault("thread_name_prefix", f"nonebot-{name}")
+            executor: Executor = ThreadPoolExecutor(**options)
+        else:
+            executor = ProcessPoolExecutor(**options)
+        _executors[name] = executor
+        logger.debug(f'Created {type_} executor "{name}"')
+
+    if "default" in _executors:
+        asyncio.get_event_loop().set_default_executor(_executors["default"])
+
+
+def shutdown_executors() -> None:
+    """
+    :说明:
+
+      关闭所有由 ``create_executors`` 创建的执行器。
+    """
+    for executor in _executors.values():
+        executor.shutdown(wait=True)
+    _executors.clear()
+
+
+def get_executor(name: Optional[str] = None) -> Optional[Executor]:
+    if name is None:
+        return None
+    if name not in _executors:
+        raise ValueError(f'Executor "{name}" not found')
+    return _executors[name]
+
+
+def run_sync(func: Callable[..., Any],
+             executor: Optional[str] = None) -> Callable[..., Awaitable[Any]]:
+    """
+    :说明:
+
+      将同步函数包装为在执行器中运行的异步函数。
+
+    :参数:
+
+      * ``func: Callable[..., Any]``: 同步函数
+      * ``executor: Optional[str]``: 配置项 ``executors`` 中的执行器名，默认使用事件循环的默认执行器。
+        使用进程池时函数及其参数需要能够被 pickle，因此不能对模块级函数使用 ``@run_sync`` 装饰器语法
+    """
 
     @wraps(func)
     async def _wrapper(*args: Any, **kwargs: Any) -> Any:
         loop = asyncio.get_running_loop()
         pfunc = partial(func, *args, **kwargs)
-        result = await loop.run_in_executor(None, pfunc)
+        result = await loop.run_in_executor(get_executor(executor), pfunc)
         return result
 
     return _wrapper
@@ -28,3 +168,106 @@ class DataclassEncoder(json.JSONEncoder):
         if dataclasses.is_dataclass(o):
             return dataclasses.asdict(o)
         return super().default(o)
+
+
+def _dataclass_default(o):
+    if dataclasses.is_dataclass(o):
+        return dataclasses.asdict(o)
+    raise TypeError(f"Object of type {type(o).__name__} "
+                    "is not JSON serializable")
+
+
+def _stdlib_dumps(obj: Any) -> str:
+    return json.dumps(obj, cls=DataclassEncoder)
+
+
+def _stdlib_dumpb(obj: Any) -> bytes:
+    return json.dumps(obj, cls=DataclassEncoder).encode("utf-8")
+
+
+def _ujson_dumps(obj: Any) -> str:
+    return ujson.dumps(obj, ensure_ascii=False, default=_dataclass_default)
+
+
+def _ujson_dumpb(obj: Any) -> bytes:
+    return _ujson_dumps(obj).encode("utf-8")
+
+
+def _orjson_dumps(obj: Any) -> str:
+    return orjson.dumps(obj).decode("utf-8")
+
+
+_json_backend = "json"
+_json_loads: Callable[[Union[str, bytes]], Any] = json.loads
+_json_dumps: Callable[[Any], str] = _stdlib_dumps
+_json_dumpb: Callable[[Any], bytes] = _stdlib_dumpb
+
+
+def set_json_backend(name: str = "auto") -> str:
+    """
+    :说明:
+
+      设置驱动器与适配器收发数据时使用的 JSON 库。
+
+    :参数:
+
+      * ``name: str``: ``auto`` (依次尝试 ``orjson`` 、 ``ujson`` 、 ``json``)、 ``orjson`` 、 ``ujson`` 或 ``json``
+
+    :返回:
+
+      - ``str``: 实际使用的 JSON 库名
+    """
+    global _json_backend, _json_loads, _json_dumps, _json_dumpb
+    if name == "auto":
+        name = "orjson" if orjson else "ujson" if ujson else "json"
+
+    if name == "orjson":
+        if not orjson:
+            raise ValueError("orjson is not installed")
+        _json_loads, _json_dumps, _json_dumpb = \
+            orjson.loads, _orjson_dumps, orjson.dumps
+    elif name == "ujson":
+        if not ujson:
+            raise ValueError("ujson is not installed")
+        _json_loads, _json_dumps, _json_dumpb = \
+            ujson.loads, _ujson_dumps, _ujson_dumpb
+    elif name == "json":
+        _json_loads, _json_dumps, _json_dumpb = \
+            json.loads, _stdlib_dumps, _stdlib_dumpb
+    else:
+        raise ValueError(f"Unknown json backend: {name}")
+
+    _json_backend = name
+    logger.debug(f"Using json backend {name}")
+    return name
+
+
+def get_json_backend() -> str:
+    return _json_backend
+
+
+def json_loads(s: Union[str, bytes]) -> Any:
+    """
+    :说明:
+
+      使用当前 JSON 库解析字符串或字节串，无需先将字节串解码为字符串。
+    """
+    return _json_loads(s)
+
+
+def json_dumps(obj: Any) -> str:
+    """
+    :说明:
+
+      使用当前 JSON 库序列化为字符串，支持 dataclass 对象。
+    """
+    return _json_dumps(obj)
+
+
+def json_dumpb(obj: Any) -> bytes:
+    """
+    :说明:
+
+      使用当前 JSON 库序列化为 UTF-8 字节串，支持 dataclass 对象。
+    """
+    return _json_dumpb(obj)